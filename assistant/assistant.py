@@ -1,45 +1,34 @@
 import threading
 from dotenv import load_dotenv
 import speech_recognition as sr
-from faster_whisper import WhisperModel
 import asyncio
-import os
 import time
-import pyttsx3
 from collections import deque
 from queue import Queue
-from datetime import datetime
-import torch
+from concurrent.futures import Future
 from assistant.client import MCPClient
 from assistant.tk_ui import ConversationUI
-from assistant.utils import get_query
+from assistant.utils import add_to_history, get_query
+from assistant.tts import Speaker
+from assistant.transcriber import (
+    FOREGROUND,
+    SAMPLE_RATE,
+    SAMPLE_WIDTH,
+    WAKE_WORD,
+    TranscriptionService,
+)
 import tomllib
 
 load_dotenv()
 with open("config.toml", "rb") as f:
     config = tomllib.load(f)["assistant"]
 
-whisper_model = config["whisper_model"]
 start_word = config["start_word"]
 json_path = config["server_config"]
 
 recognizer = sr.Recognizer()
 microphone = sr.Microphone()
 
-if torch.cuda.is_available():
-    model = WhisperModel(model_size_or_path=whisper_model, device="cuda")
-    print("Using cuda")
-else:
-    num_cores = os.cpu_count()
-    if not num_cores:
-        num_cores = 8
-    model = WhisperModel(
-        model_size_or_path=whisper_model,
-        device="cpu",
-        cpu_threads=num_cores // 2,
-        num_workers=num_cores // 2,
-    )
-
 
 class Assistant:
     def __init__(
@@ -50,9 +39,13 @@ class Assistant:
         return_queue=Queue(),
         ws_manager=None,
         ui_notification=Queue(),
+        transcriber: TranscriptionService | None = None,
+        speaker: Speaker | None = None,
     ):
         self.started = False
         self.m_started = False
+        self.in_foreground = False
+        self.stop_listening = None
         self.message_queue = message_queue
         self.conversation_history = conversation_history
         self.return_queue = return_queue
@@ -60,27 +53,21 @@ class Assistant:
         self.ui_notification = ui_notification
         self.th = None
         self.client = client
+        self.transcriber = transcriber or TranscriptionService()
+        self.speaker = speaker or Speaker()
+
+    def listen(self, source: sr.Microphone) -> sr.AudioData:
+        """Listen for audio on opened microphone"""
+        return recognizer.listen(source)  # type: ignore
 
-    def listen(self, path: str = "audio.wav") -> str:
-        """Listen for audio and save to file"""
-        audio = recognizer.listen(microphone)
-        with open(path, "wb") as f:
-            f.write(audio.get_wav_data())  # type: ignore
-        return path
+    def submit_audio(self, audio: sr.AudioData, priority: int = FOREGROUND) -> Future:
+        """Queue audio for transcription without blocking"""
+        pcm = audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=SAMPLE_WIDTH)
+        return self.transcriber.submit(pcm, priority)
 
-    def transcribe(self, path: str = "audio.wav") -> str:
+    def transcribe(self, audio: sr.AudioData, priority: int = FOREGROUND) -> str:
         """Recognize text from audio"""
-        segs, _ = model.transcribe(
-            path,
-            beam_size=5,
-            language="en",
-            condition_on_previous_text=False,
-            log_prob_threshold=0.4,
-            no_speech_threshold=0.5,
-            hotwords=f"{start_word}",
-        )
-        text = "".join([s.text for s in segs])
-        return text
+        return self.submit_audio(audio, priority).result()
 
     async def process_query(self, query: str | None) -> None:
         """Get response from LLM-MCP client and process it"""
@@ -96,44 +83,58 @@ class Assistant:
         self.ui_notification.put("Listening")
 
     async def foreground_chat(self, query: str | None = None) -> None:
-        """Voice chat loop"""
-        if query:
-            await self.process_query(query)
-        else:
-            self.ui_notification.put("Listening")
-            pyttsx3.speak("Hello user!")
-            await self.add_to_history("assistant", "Hello User!")
-
-        if self.stop_listening is not None:
-            self.stop_listening(wait_for_stop=False)
-        while True:
-            if not self.return_queue.empty():
-                query = self.return_queue.get()
+        """Voice chat loop, listens in background again when it ends"""
+        try:
+            # background listener must release microphone before it is reopened
+            if self.stop_listening is not None:
+                self.stop_listening(wait_for_stop=True)
+                self.stop_listening = None
+            if query:
+                await self.process_query(query)
             else:
-                audio_p = self.listen()
-                query = self.transcribe(audio_p)
-            if query == "quit" or query == "exit":
-                self.start_background_chat()
-                print("foreground chat stopped!")
-                return
-            await self.process_query(query)
+                self.ui_notification.put("Listening")
+                self.speaker.speak("Hello user!")
+                await self.add_to_history("assistant", "Hello User!")
+
+            with microphone as source:
+                while True:
+                    if not self.return_queue.empty():
+                        query = self.return_queue.get()
+                    else:
+                        audio = self.listen(source)
+                        query = self.transcribe(audio)
+                    if query == "quit" or query == "exit":
+                        print("foreground chat stopped!")
+                        return
+                    await self.process_query(query)
+        except Exception as e:
+            print(f"Error in foreground chat: {e}")
+        finally:
+            self.in_foreground = False
+            self.start_listening()
 
     def start_foreground_chat(self, recognizer, audio) -> None:
-        """Callback that starts voice chat loop when start word is detected"""
+        """Callback that queues audio for start word detection"""
+        if self.in_foreground:
+            return
         try:
-            with open("audio.wav", "wb") as f:
-                f.write(audio.get_wav_data())
-            query = self.transcribe("audio.wav")
-            # print("pp query", query)
-            # to do
-            query = get_query(query, start_word)
-            if query is None:
-                # print("not", query)
-                return
-            asyncio.run(self.foreground_chat(query))
+            future = self.submit_audio(audio, WAKE_WORD)
+            future.add_done_callback(self.check_start_word)
         except Exception as e:
             print(f"Error: {e}")
 
+    def check_start_word(self, future: Future) -> None:
+        """Start voice chat loop in new thread when start word is detected"""
+        if future.cancelled() or future.exception() or self.in_foreground:
+            return
+        query = get_query(future.result(), start_word)
+        if query is None:
+            return
+        self.in_foreground = True
+        threading.Thread(
+            target=asyncio.run, args=(self.foreground_chat(query),), daemon=True
+        ).start()
+
     def background_callback(self, recognizer, audio) -> None:
         """Experimental backgroun chat loop"""
         try:
@@ -144,9 +145,9 @@ class Assistant:
                     self.ui_notification.put("Listening.")
                     return
             else:
-                with open("audio.wav", "wb") as f:
-                    f.write(audio.get_wav_data())
-                query = self.transcribe("audio.wav")
+                query = self.transcribe(
+                    audio, FOREGROUND if self.started else WAKE_WORD
+                )
                 if not self.started:
                     query = get_query(query, start_word)
                     if query:
@@ -166,8 +167,8 @@ class Assistant:
         except Exception as e:
             print("Error in callback chat; {0}".format(e))
 
-    def start_background_chat(self) -> None:
-        """Start background listening"""
+    def start_listening(self) -> None:
+        """Start listening for start word in background thread"""
         if not self.m_started:
             with microphone as source:
                 recognizer.energy_threshold = 500
@@ -180,21 +181,25 @@ class Assistant:
             microphone, self.start_foreground_chat
         )
         # self.stop_listening = recognizer.listen_in_background(m, self.background_callback)
+
+    def start_background_chat(self) -> None:
+        """Start background listening"""
+        self.ui_notification.put("Loading model")
+        threading.Thread(target=self.speaker.warm, daemon=True).start()
+        self.transcriber.start()
+        self.start_listening()
         while True:
             time.sleep(0.5)
 
     async def add_to_history(self, role: str, content: str):
         """Add message to history and queue for UI update"""
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat(),
-        }
-        self.conversation_history.append(message)
-        self.message_queue.put(message)
-
-        if self.ws_manager:
-            await self.ws_manager.broadcast(message)
+        await add_to_history(
+            self.conversation_history,
+            role,
+            content,
+            self.message_queue,
+            self.ws_manager,
+        )
 
     async def process_response(self, response_text) -> str:
         """Process response from LLM-MCP client"""
@@ -212,13 +217,15 @@ class Assistant:
                 if not th or not th.is_alive():
                     if th:
                         th.join()
-                    th = threading.Thread(target=pyttsx3.speak(curr_text))
+                    th = threading.Thread(
+                        target=self.speaker.speak, args=(curr_text,)
+                    )
                     curr_text = ""
                     th.start()
         if th:
             th.join()
         if curr_text:
-            self.th = threading.Thread(target=pyttsx3.speak(curr_text))
+            self.th = threading.Thread(target=self.speaker.speak, args=(curr_text,))
             self.th.start()
         print("\n")
         return full_text
@@ -244,6 +251,7 @@ async def main():
         await asyncio.Event().wait()
 
     finally:
+        ass.transcriber.stop()
         await client.cleanup()
 
 
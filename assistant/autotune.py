@@ -0,0 +1,146 @@
+import json
+import os
+import re
+import time
+from datetime import date
+import tomllib
+from assistant.transcriber import get_device, load_model, transcribe_audio, whisper_model
+from assistant.utils import word_error_rate
+
+CONFIG_PATH = "config.toml"
+
+with open(CONFIG_PATH, "rb") as f:
+    config = tomllib.load(f)["autotune"]
+
+samples_path = config["samples"]
+compute_types = config["compute_types"]
+beam_sizes = config["beam_sizes"]
+wer_threshold = config["wer_threshold"]
+
+
+def thread_counts() -> list[int]:
+    """Candidate cpu thread counts for this machine"""
+    if "cpu_threads" in config:
+        return config["cpu_threads"]
+    num_cores = os.cpu_count() or 8
+    return sorted({max(1, num_cores // 4), max(1, num_cores // 2), num_cores})
+
+
+def load_samples(path: str = samples_path) -> tuple[list[tuple], int]:
+    """Load sample utterances as (waveform, reference text) pairs.
+
+    Recordings placed next to the samples file are used as they are, missing
+    ones are synthesized with TTS into the `generated` folder. Also returns
+    how many samples are synthetic.
+    """
+    from faster_whisper import decode_audio
+
+    with open(path, "r") as f:
+        entries = json.load(f)
+    sample_dir = os.path.dirname(path)
+    generated_dir = os.path.join(sample_dir, "generated")
+    engine = None
+    samples = []
+    synthetic = 0
+    for entry in entries:
+        audio_path = os.path.join(sample_dir, entry["file"])
+        if not os.path.exists(audio_path):
+            synthetic += 1
+            audio_path = os.path.join(generated_dir, entry["file"])
+        if not os.path.exists(audio_path):
+            if engine is None:
+                import pyttsx3
+
+                os.makedirs(generated_dir, exist_ok=True)
+                engine = pyttsx3.init()
+            engine.save_to_file(entry["text"], audio_path)
+            engine.runAndWait()
+        samples.append((decode_audio(audio_path), entry["text"]))
+    return samples, synthetic
+
+
+def benchmark(model, samples, beam_size: int) -> tuple[float, float]:
+    """Return mean seconds per utterance and mean WER"""
+    # warm up
+    transcribe_audio(model, samples[0][0], beam_size=beam_size)
+    total_time = 0.0
+    total_wer = 0.0
+    for audio, text in samples:
+        start = time.perf_counter()
+        hyp = transcribe_audio(model, audio, beam_size=beam_size)
+        total_time += time.perf_counter() - start
+        total_wer += word_error_rate(text, hyp)
+    return total_time / len(samples), total_wer / len(samples)
+
+
+def save_profile(profile: dict, comment: str, path: str = CONFIG_PATH) -> None:
+    """Replace [whisper_profile] section of config file"""
+    with open(path, "r", newline="") as f:
+        text = f.read()
+    nl = "\r\n" if "\r\n" in text else "\n"
+    text = re.sub(
+        r"^(# .*\r?\n)?\[whisper_profile\]\r?\n.*?(?=^\[|\Z)",
+        "",
+        text,
+        flags=re.MULTILINE | re.DOTALL,
+    ).rstrip()
+    lines = [f"# {comment}", "[whisper_profile]"]
+    for key, value in profile.items():
+        lines.append(f"{key} = {json.dumps(value)}")
+    text += nl + nl + nl.join(lines) + nl
+    with open(path, "w", newline="") as f:
+        f.write(text)
+
+
+def autotune() -> dict | None:
+    """Benchmark all combinations and save fastest one within WER threshold"""
+    samples, synthetic = load_samples()
+    if synthetic:
+        print(
+            f"{synthetic}/{len(samples)} samples are synthesized with this machine's"
+            " TTS voice, WER is not comparable to other machines."
+        )
+    device = get_device()
+    threads = thread_counts() if device == "cpu" else [0]
+    results = []
+    for compute_type in compute_types:
+        for cpu_threads in threads:
+            profile = {"device": device, "compute_type": compute_type}
+            if device == "cpu":
+                profile["cpu_threads"] = cpu_threads
+            try:
+                model = load_model(whisper_model, profile)
+            except ValueError as e:
+                print(f"Skipping {compute_type}: {e}")
+                break
+            for beam_size in beam_sizes:
+                secs, wer = benchmark(model, samples, beam_size)
+                results.append(({**profile, "beam_size": beam_size}, secs, wer))
+                print(
+                    f"{compute_type:>14} threads={cpu_threads:<3} beam={beam_size:<2}"
+                    f" {secs * 1000:8.1f} ms/utterance  WER={wer:.3f}"
+                )
+            del model
+
+    if not results:
+        print("No setup could be benchmarked, config not changed.")
+        return None
+    accurate = [r for r in results if r[2] <= wer_threshold]
+    if not accurate:
+        best_wer = min(r[2] for r in results)
+        print(
+            f"No setup reached WER <= {wer_threshold} (best {best_wer:.3f}),"
+            " config not changed. Record real samples or raise wer_threshold."
+        )
+        return None
+    best, secs, wer = min(accurate, key=lambda r: r[1])
+    save_profile(
+        best,
+        f"autotuned {date.today()}: {secs * 1000:.1f} ms/utterance, WER {wer:.3f}",
+    )
+    print("Saved profile:", best)
+    return best
+
+
+if __name__ == "__main__":
+    autotune()
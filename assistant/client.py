@@ -1,13 +1,18 @@
 import asyncio
 from contextlib import AsyncExitStack
 from typing import AsyncIterator
-from mcp import ClientSession, StdioServerParameters, types as mcp_types
-from mcp.client.stdio import stdio_client
+from mcp import StdioServerParameters, types as mcp_types
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 import json
+import re
 import tomllib
+from assistant.shaping import shape_result
+from assistant.context_cache import ContextCache, GeminiCacheBackend
+from assistant import response_cache
+from assistant.mcp_servers import EAGER, ServerConnection
+from assistant import resilience
 # import streamlit as st
 
 load_dotenv()
@@ -18,6 +23,8 @@ with open("config.toml", "rb") as f:
 sys_message = config["SYS_INST"]
 MODEL = config["MODEL"]
 server_config_path = config["server_config"]
+use_context_cache = config["context_cache"]
+context_cache_ttl = config["context_cache_ttl"]
 
 
 class MCPClient:
@@ -27,7 +34,24 @@ class MCPClient:
         self.mcp_config: types.GenerateContentConfig | None = None
         self.mcp_chat = None
         self.mcp_tools: list[mcp_types.Tool] = []
-        self.parameters: dict[str, dict] = {}
+        self.servers: dict[str, ServerConnection] = {}
+        self.tool_servers: dict[str, ServerConnection] = {}
+        self.tool_options: dict[str, dict] = {}
+        self.breakers: dict[str, resilience.CircuitBreaker] = {}
+        self.first_chunk_latency = resilience.LatencyTracker()
+        self.context_cache: ContextCache | None = None
+        if use_context_cache:
+            self.context_cache = ContextCache(
+                GeminiCacheBackend(self.client), MODEL, sys_message, context_cache_ttl
+            )
+        self.response_cache: response_cache.ResponseCache | None = None
+        if response_cache.enabled:
+            try:
+                self.response_cache = response_cache.ResponseCache(
+                    response_cache.Embedder()
+                )
+            except ImportError:
+                print("Response cache needs fastembed package, cache disabled.")
 
     async def connect_to_server(self) -> bool:
         """Connect to an MCP server
@@ -40,22 +64,31 @@ class MCPClient:
                 params = json.load(f)
 
             all_tools = []
-            tool_to_params = {}
             for name, params in params["mcpServers"].items():
                 server_param = StdioServerParameters(
                     command=params["command"],
                     args=params["args"],
                 )
-                async with stdio_client(server_param) as (read, write):
-                    async with ClientSession(read, write) as session:
-                        await session.initialize()
-                        response = await session.list_tools()
-                        all_tools.extend(response.tools)
-                        for tool in response.tools:
-                            tool_to_params[tool.name] = server_param
+                self.tool_options.update(params.get("tools", {}))
+                server = ServerConnection(
+                    name,
+                    server_param,
+                    params.get("policy", EAGER),
+                    params.get("idleTimeout", 10) * 60,
+                    on_tools_changed=self.update_tools,
+                )
+                try:
+                    tools = await server.connect()
+                except Exception as e:
+                    print(f"Could not connect to MCP server {name}: {e}")
+                    continue
+                self.servers[name] = server
+                self.breakers[name] = resilience.CircuitBreaker()
+                all_tools.extend(tools)
+                for tool in tools:
+                    self.tool_servers[tool.name] = server
 
             self.mcp_tools = all_tools
-            self.parameters = tool_to_params
             print(
                 "\nConnected to server with tools:", [tool.name for tool in all_tools]
             )
@@ -64,6 +97,23 @@ class MCPClient:
             print("Could not setup MCP connection: ", e)
             return False
 
+    def update_tools(self, server: ServerConnection) -> None:
+        """Use current tools of server, e.g. after its cached tools were stale"""
+        for name, tool_server in list(self.tool_servers.items()):
+            if tool_server is server:
+                del self.tool_servers[name]
+        for tool in server.tools:
+            self.tool_servers[tool.name] = server
+        self.mcp_tools = [tool for s in self.servers.values() for tool in s.tools]
+        if self.mcp_config:
+            self.mcp_config = self.mcp_config.model_copy(
+                update={"tools": self.mcp_tools}
+            )
+
+    def server_stats(self) -> dict[str, dict]:
+        """Policy, resident memory and cold start latency of each MCP server"""
+        return {name: server.stats() for name, server in self.servers.items()}
+
     async def init_chat(self) -> None:
         """Intialize LLM chat object"""
         mcp_config = genai.types.GenerateContentConfig(
@@ -72,54 +122,180 @@ class MCPClient:
             candidate_count=1,  # type: ignore
         )
         self.mcp_config = mcp_config
-        self.mcp_chat = self.client.aio.chats.create(model=MODEL, config=mcp_config)
+        self.mcp_chat = self.new_chat()
 
-    async def get_response(self, m) -> AsyncIterator[types.GenerateContentResponse]:
+    def new_chat(self):
+        """Create chat with its own history, sharing model client and tools"""
+        return self.client.aio.chats.create(model=MODEL, config=self.mcp_config)
+
+    async def get_config(self) -> types.GenerateContentConfig | None:
+        """Config referencing cached system instruction and tools if available"""
+        if self.context_cache:
+            name = await self.context_cache.get(self.mcp_tools)
+            if name:
+                return types.GenerateContentConfig(
+                    cached_content=name,
+                    candidate_count=1,
+                )
+        return self.mcp_config
+
+    async def get_response(
+        self, m, chat=None
+    ) -> AsyncIterator[types.GenerateContentResponse]:
         """Get response from LLM"""
-        if not self.mcp_chat:
+        chat = chat or self.mcp_chat
+        if not chat:
             raise Exception("Chat is not initialized.")
-        res = await self.mcp_chat.send_message_stream(m, config=self.mcp_config)
-        return res
+        return self.stream_response(m, chat, await self.get_config())
+
+    async def stream_response(
+        self, m, chat, config: types.GenerateContentConfig | None
+    ) -> AsyncIterator[types.GenerateContentResponse]:
+        """Stream response, resending once with inline tools if cached content fails"""
+
+        def opener(config):
+            async def open_stream():
+                return await chat.send_message_stream(m, config=config)
+
+            return open_stream
+
+        started = False
+        try:
+            async for chunk in resilience.hedged_stream(
+                opener(config), self.first_chunk_latency
+            ):
+                started = True
+                yield chunk
+            return
+        except Exception as e:
+            if started or not (config and config.cached_content):
+                raise
+            # e.g. cache was deleted or expired early
+            print(f"\nRequest with context cache failed, sending tools inline: {e!r}")
+            self.context_cache.invalidate()  # type: ignore
+        async for chunk in resilience.hedged_stream(
+            opener(self.mcp_config), self.first_chunk_latency
+        ):
+            yield chunk
 
     async def call_tool(self, name: str, args: dict[str, str]) -> str | dict[str, str]:
         "Call MCP tool and return result or error message"
-        params = self.parameters[name]
-        async with stdio_client(params) as (read, write):  # type: ignore
-            async with ClientSession(read, write) as session:
-                # Initialize the connection
-                await session.initialize()
-                res = await session.call_tool(name, args)
-                if res.isError:
-                    return res.content[0].text  # type: ignore
+        server = self.tool_servers[name]
+        breaker = self.breakers[server.name]
+        if not breaker.allow():
+            print(f"\n[MCP server {server.name} is unavailable, skipping {name}]")
+            return resilience.tool_fallback
+
+        attempts = 1
+        if self.tool_options.get(name, {}).get("idempotent"):
+            attempts += resilience.tool_retries
+
+        async def attempt() -> mcp_types.CallToolResult:
+            res = await asyncio.wait_for(
+                server.call_tool(name, args), resilience.tool_timeout
+            )
+            # MCP servers report their own backend failing as error results
+            if res.isError and resilience.tool_error_pattern.search(
+                res.content[0].text  # type: ignore
+            ):
+                raise resilience.ToolError(res.content[0].text)  # type: ignore
+            return res
+
+        try:
+            res = await resilience.retry(attempt, attempts)
+        except Exception as e:
+            breaker.record_failure()
+            print(f"\n[Tool {name} failed: {e!r}]")
+            return resilience.tool_fallback
+        finally:
+            # a cancelled trial call must not leave the breaker rejecting calls
+            breaker.release()
+        breaker.record_success()
+        if res.isError:
+            return res.content[0].text  # type: ignore
         return res.structuredContent["result"]  # type: ignore
 
-    async def process_query(self, query: str):
-        """Process a query using model and available tools"""
+    async def process_query(self, query: str, chat=None):
+        """Process a query using model and available tools
+
+        Args:
+            query: User query
+            chat: Chat to use, defaults to chat created by init_chat
+        """
+        chat = chat or self.mcp_chat
+        if self.response_cache:
+            answer = await asyncio.to_thread(self.response_cache.lookup, query)
+            if answer is not None:
+                print("\n[Response cache hit]")
+                chat.record_history(  # type: ignore
+                    user_input=types.UserContent(parts=[types.Part(text=query)]),
+                    model_output=[
+                        types.ModelContent(parts=[types.Part(text=answer)])
+                    ],
+                    automatic_function_calling_history=[],
+                    is_valid=True,
+                )
+                for sentence in re.split(r"(?<=[.!?]\s)", answer):
+                    if sentence:
+                        yield sentence
+                return
+
         curr_query = types.Part(text=query)
+        full_text = ""
+        tools_used = set()
+        cacheable = True
         i = 0
         while i < 3:
-            response = await self.get_response(curr_query)
+            response = await self.get_response(curr_query, chat)
             f_call = False
 
-            async for chunk in response:
-                if fun_call := chunk.candidates[0].content.parts[0].function_call:  # type: ignore
-                    f_call = True
-                    function_call = fun_call
-                    tool_name = function_call.name
-                    tool_args = function_call.args
-
-                    result = await self.call_tool(tool_name, tool_args)  # type: ignore
-                    print(f"\n[Calling tool {tool_name} with args {tool_args}]")
-                    curr_query = types.Part(
-                        text=f"Tool_name: {tool_name}, Tool_response: {result}"
-                    )
-                    break
-                else:
-                    yield (chunk.text)
+            try:
+                async for chunk in response:
+                    if fun_call := chunk.candidates[0].content.parts[0].function_call:  # type: ignore
+                        f_call = True
+                        function_call = fun_call
+                        tool_name = function_call.name
+                        tool_args = function_call.args
+                        options = self.tool_options.get(tool_name, {})  # type: ignore
+                        tools_used.add(tool_name)
+                        cacheable = cacheable and options.get("cacheable", False)
+
+                        result = await self.call_tool(tool_name, tool_args)  # type: ignore
+                        if result == resilience.tool_fallback:
+                            cacheable = False
+                        if self.response_cache and options.get("invalidates"):
+                            self.response_cache.invalidate(
+                                set(options["invalidates"])
+                            )
+                        print(f"\n[Calling tool {tool_name} with args {tool_args}]")
+                        curr_query = shape_result(
+                            tool_name,  # type: ignore
+                            tool_args,  # type: ignore
+                            result,
+                            options,
+                        )
+                        break
+                    else:
+                        full_text += chunk.text or ""
+                        yield (chunk.text)
+            except Exception as e:
+                print(f"\nModel request failed: {e!r}")
+                yield resilience.llm_fallback
+                return
             i += 1
             if not f_call:
                 break
 
+        if (
+            self.response_cache
+            and cacheable
+            and full_text
+            and (tools_used or response_cache.cache_tool_free_turns)
+        ):
+            await asyncio.to_thread(
+                self.response_cache.store, query, full_text, tools_used
+            )
+
     async def chat_loop(self) -> None:
         """Run an interactive chat loop"""
         print("\nMCP Client Started!")
@@ -142,6 +318,10 @@ class MCPClient:
 
     async def cleanup(self) -> None:
         """Clean up resources"""
+        if self.context_cache:
+            await self.context_cache.delete()
+        for server in self.servers.values():
+            await server.close()
         await self.exit_stack.aclose()
 
 
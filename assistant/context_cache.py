@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import json
+import time
+from abc import ABC, abstractmethod
+from google import genai
+from google.genai import types
+from mcp import types as mcp_types
+
+
+def gemini_tools(tools: list[mcp_types.Tool]) -> list[types.Tool]:
+    """Gemini function declarations for MCP tools"""
+    return [
+        types.Tool(
+            function_declarations=[
+                types.FunctionDeclaration(
+                    name=tool.name,
+                    description=tool.description,
+                    parameters_json_schema=tool.inputSchema,
+                )
+                for tool in tools
+            ]
+        )
+    ]
+
+
+class CacheBackend(ABC):
+    """Stores system instruction and tools as cached content"""
+
+    @abstractmethod
+    async def create(
+        self, model: str, system_instruction: str, tools: list[mcp_types.Tool], ttl: int
+    ) -> tuple[str, float]:
+        """Create cached content, return its name and expire timestamp"""
+
+    @abstractmethod
+    async def delete(self, name: str) -> None: ...
+
+
+class GeminiCacheBackend(CacheBackend):
+    """Gemini API explicit context caching"""
+
+    def __init__(self, client: genai.Client):
+        self.client = client
+
+    async def create(
+        self, model: str, system_instruction: str, tools: list[mcp_types.Tool], ttl: int
+    ) -> tuple[str, float]:
+        cache = await self.client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                display_name="voice-assistant",
+                system_instruction=system_instruction,
+                tools=gemini_tools(tools),
+                ttl=f"{ttl}s",
+            ),
+        )
+        if cache.expire_time:
+            return cache.name, cache.expire_time.timestamp()  # type: ignore
+        return cache.name, time.time() + ttl  # type: ignore
+
+    async def delete(self, name: str) -> None:
+        await self.client.aio.caches.delete(name=name)
+
+
+class ContextCache:
+    """Keeps cached content for current system instruction and tool set.
+
+    Cache is created in a background task, and recreated shortly before it
+    expires or when the tools change, so requests never wait for it. Until
+    it is ready, or when it can't be created (e.g. model doesn't support
+    caching or prompt is below minimum size), get returns None and callers
+    send system instruction and tools inline instead. Failed creation is
+    retried after `ttl` seconds.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        model: str,
+        system_instruction: str,
+        ttl: int = 3600,
+        refresh_margin: int = 60,
+    ):
+        self.backend = backend
+        self.model = model
+        self.system_instruction = system_instruction
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.name: str | None = None
+        self.expire_time = 0.0
+        self.tools_key: str | None = None
+        self.retry_time = 0.0
+        self.task: asyncio.Task | None = None
+
+    @staticmethod
+    def key(tools: list[mcp_types.Tool]) -> str:
+        schemas = [[t.name, t.description, t.inputSchema] for t in tools]
+        return hashlib.sha1(json.dumps(schemas, sort_keys=True).encode()).hexdigest()
+
+    def valid(self, key: str) -> bool:
+        return (
+            self.name is not None
+            and key == self.tools_key
+            and time.time() < self.expire_time - self.refresh_margin
+        )
+
+    async def get(self, tools: list[mcp_types.Tool]) -> str | None:
+        """Return name of cached content for tools, None if not available"""
+        key = self.key(tools)
+        if self.valid(key):
+            return self.name
+        refreshing = self.task is not None and not self.task.done()
+        if not refreshing and time.time() >= self.retry_time:
+            self.task = asyncio.create_task(self._refresh(tools, key))
+        # still usable while it is being refreshed
+        if self.name and key == self.tools_key and time.time() < self.expire_time:
+            return self.name
+        return None
+
+    async def _refresh(self, tools: list[mcp_types.Tool], key: str) -> None:
+        old_name = self.name if key != self.tools_key else None
+        try:
+            name, expire_time = await self.backend.create(
+                self.model, self.system_instruction, tools, self.ttl
+            )
+        except Exception as e:
+            print("Context caching not available:", e)
+            self.retry_time = time.time() + self.ttl
+            return
+        self.name, self.expire_time, self.tools_key = name, expire_time, key
+        print("Created context cache:", name)
+        if old_name:
+            await self.delete(old_name)
+
+    def invalidate(self) -> None:
+        """Stop using current cached content, e.g. after a request with it failed"""
+        self.name = None
+
+    async def delete(self, name: str | None = None) -> None:
+        """Delete given or current cached content"""
+        if name is None and self.task and not self.task.done():
+            self.task.cancel()
+        name = name or self.name
+        if not name:
+            return
+        if name == self.name:
+            self.name = None
+        try:
+            await self.backend.delete(name)
+        except Exception as e:
+            print(f"Could not delete context cache {name}: {e}")
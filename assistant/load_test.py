@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from websockets.asyncio.client import connect
+import tomllib
+
+with open("config.toml", "rb") as f:
+    config = tomllib.load(f)["server"]
+
+QUERIES = [
+    "What decks do I have?",
+    "How many cards are due today?",
+    "Tell me an interesting fact about the Roman Empire.",
+]
+
+
+async def run_session(url: str, queries: int, audio: bytes | None) -> list[float]:
+    """Open one session, send queries and return latency of each turn"""
+    latencies = []
+    async with connect(url, max_size=None) as ws:
+        for i in range(queries):
+            start = time.perf_counter()
+            if audio:
+                await ws.send(audio)
+            else:
+                query = QUERIES[i % len(QUERIES)]
+                await ws.send(json.dumps({"type": "text", "text": query}))
+            while True:
+                message = json.loads(await ws.recv())
+                if message["type"] == "error":
+                    raise Exception(message["error"])
+                if message["type"] == "done":
+                    break
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def main(args) -> None:
+    audio = None
+    if args.audio:
+        from faster_whisper import decode_audio
+
+        audio = (decode_audio(args.audio) * 32767).astype("<i2").tobytes()
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *[run_session(args.url, args.queries, audio) for _ in range(args.sessions)],
+        return_exceptions=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    latencies = [t for r in results if isinstance(r, list) for t in r]
+    errors = [r for r in results if isinstance(r, BaseException)]
+    completed = args.sessions - len(errors)
+    print(f"Sessions: {completed}/{args.sessions} completed in {elapsed:.2f}s")
+    print(f"Throughput: {completed / elapsed:.2f} sessions/s")
+    if latencies:
+        latencies.sort()
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        print(
+            f"Turn latency: p50 {statistics.median(latencies) * 1000:.0f} ms,"
+            f" p95 {p95 * 1000:.0f} ms"
+        )
+    for e in errors[:5]:
+        print("Error:", e)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test headless server")
+    parser.add_argument("--url", default=f"ws://{config['host']}:{config['port']}")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=3, help="Queries per session")
+    parser.add_argument("--audio", help="Send this audio file instead of text")
+    asyncio.run(main(parser.parse_args()))
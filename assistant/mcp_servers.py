@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Callable
+from mcp import ClientSession, StdioServerParameters, types as mcp_types
+from mcp.client.stdio import stdio_client
+
+TOOLS_CACHE_PATH = ".mcp_tools_cache.json"
+
+# Server policies
+EAGER = "eager"  # started on connect, kept running
+LAZY = "lazy"  # started on first tool call, kept running
+IDLE = "idle"  # started on first tool call, stopped after idle timeout
+
+
+def child_pids(pid: int) -> set[int]:
+    """Direct children of process, empty where /proc is not available"""
+    children = set()
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.update(int(c) for c in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def tree_rss(pid: int) -> int:
+    """Resident memory in bytes of process and its descendants"""
+    rss = 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1]) * 1024
+    except OSError:
+        return 0
+    return rss + sum(tree_rss(c) for c in child_pids(pid))
+
+
+def params_key(name: str, params: StdioServerParameters) -> str:
+    raw = json.dumps([name, params.command, params.args])
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def load_cached_tools(name: str, params: StdioServerParameters) -> list | None:
+    """Tools saved from previous run of server with same command"""
+    try:
+        with open(TOOLS_CACHE_PATH, "r") as f:
+            cached = json.load(f).get(params_key(name, params))
+    except (OSError, ValueError):
+        return None
+    if cached is None:
+        return None
+    return [mcp_types.Tool.model_validate(t) for t in cached]
+
+
+def save_cached_tools(
+    name: str, params: StdioServerParameters, tools: list[mcp_types.Tool]
+) -> None:
+    try:
+        with open(TOOLS_CACHE_PATH, "r") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cache[params_key(name, params)] = [t.model_dump(mode="json") for t in tools]
+    with open(TOOLS_CACHE_PATH, "w") as f:
+        json.dump(cache, f)
+
+
+class ServerConnection:
+    """Long-lived session to a MCP server shared by all chats.
+
+    The session lives in a task on the event loop that connected it, calls
+    from other event loops (e.g. voice chat threads) are forwarded to that
+    loop. Lazy and idle servers are only spawned on the first tool call,
+    using tool schemas cached from an earlier run; idle servers are stopped
+    again after `idle_timeout` seconds without calls. When a started server
+    lists different tools than the cached ones, the cache is rewritten and
+    `on_tools_changed` is called.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        params: StdioServerParameters,
+        policy: str = EAGER,
+        idle_timeout: float = 600,
+        on_tools_changed: Callable[["ServerConnection"], None] | None = None,
+    ):
+        self.name = name
+        self.params = params
+        self.policy = policy
+        self.idle_timeout = idle_timeout
+        self.on_tools_changed = on_tools_changed
+        self.tools: list[mcp_types.Tool] = []
+        self.session: ClientSession | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.pids: set[int] = set()
+        self.starts = 0
+        self.cold_start: float | None = None
+        self.last_used = 0.0
+        self.active_calls = 0
+        self._task: asyncio.Task | None = None
+        self._closing: asyncio.Event | None = None
+        self._lock: asyncio.Lock | None = None
+        self._idle_task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self.session is not None
+
+    async def connect(self) -> list[mcp_types.Tool]:
+        """Get server tools, spawning it unless policy allows cached tools"""
+        self.loop = asyncio.get_running_loop()
+        self._lock = asyncio.Lock()
+        cached = None
+        if self.policy != EAGER:
+            cached = load_cached_tools(self.name, self.params)
+        if cached is not None:
+            self.tools = cached
+        else:
+            await self.start()
+            if self.policy != EAGER:
+                await self.stop()
+        if self.policy == IDLE:
+            self._idle_task = asyncio.create_task(self._stop_when_idle())
+        return self.tools
+
+    async def start(self) -> None:
+        """Spawn server process and initialize session"""
+        start = time.perf_counter()
+        before = child_pids(os.getpid())
+        self._closing = asyncio.Event()
+        ready = self.loop.create_future()  # type: ignore
+        self._task = asyncio.create_task(self._run(ready))
+        old_tools = self.tools
+        self.tools = await ready
+        self.cold_start = time.perf_counter() - start
+        self.pids = child_pids(os.getpid()) - before
+        self.starts += 1
+        self.last_used = time.monotonic()
+        print(
+            f"Started MCP server {self.name} in {self.cold_start * 1000:.0f} ms,"
+            f" {self.rss() / 2**20:.1f} MB resident"
+        )
+        dump = [t.model_dump(mode="json") for t in self.tools]
+        if dump != [t.model_dump(mode="json") for t in old_tools]:
+            save_cached_tools(self.name, self.params, self.tools)
+            if old_tools:
+                print(f"Tools of MCP server {self.name} changed")
+                if self.on_tools_changed:
+                    self.on_tools_changed(self)
+
+    async def _run(self, ready: asyncio.Future) -> None:
+        try:
+            async with stdio_client(self.params) as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    response = await session.list_tools()
+                    self.session = session
+                    ready.set_result(response.tools)
+                    await self._closing.wait()  # type: ignore
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"MCP server {self.name} stopped: {e}")
+        finally:
+            self.session = None
+            self.pids = set()
+
+    async def call_tool(self, name: str, args: dict) -> mcp_types.CallToolResult:
+        """Call tool on this server, starting it if needed"""
+        if self.loop is not asyncio.get_running_loop():
+            future = asyncio.run_coroutine_threadsafe(
+                self.call_tool(name, args),
+                self.loop,  # type: ignore
+            )
+            return await asyncio.wrap_future(future)
+        self.active_calls += 1
+        try:
+            async with self._lock:  # type: ignore
+                if not self.running:
+                    if self._task:
+                        await self.stop()
+                    await self.start()
+            return await self.session.call_tool(name, args)  # type: ignore
+        finally:
+            self.active_calls -= 1
+            self.last_used = time.monotonic()
+
+    async def _stop_when_idle(self) -> None:
+        interval = max(1, min(30, self.idle_timeout / 2))
+        while True:
+            await asyncio.sleep(interval)
+            idle = time.monotonic() - self.last_used
+            if self.running and not self.active_calls and idle > self.idle_timeout:
+                async with self._lock:  # type: ignore
+                    if not self.active_calls:
+                        print(f"Stopping idle MCP server {self.name}")
+                        await self.stop()
+
+    def rss(self) -> int:
+        """Resident memory in bytes of server processes"""
+        return sum(tree_rss(pid) for pid in self.pids)
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "running": self.running,
+            "starts": self.starts,
+            "cold_start_ms": self.cold_start and self.cold_start * 1000,
+            "rss_mb": self.rss() / 2**20,
+        }
+
+    async def stop(self) -> None:
+        """Close session and stop server process"""
+        if self._task:
+            self._closing.set()  # type: ignore
+            await self._task
+            self._task = None
+
+    async def close(self) -> None:
+        """Stop server and idle checks"""
+        if self._idle_task:
+            self._idle_task.cancel()
+            self._idle_task = None
+        await self.stop()
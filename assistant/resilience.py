@@ -0,0 +1,191 @@
+import asyncio
+import random
+import re
+import time
+from collections import deque
+from contextlib import suppress
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+import tomllib
+
+with open("config.toml", "rb") as f:
+    config = tomllib.load(f)["resilience"]
+
+first_chunk_timeout = config["first_chunk_timeout"]
+chunk_timeout = config["chunk_timeout"]
+tool_timeout = config["tool_timeout"]
+tool_retries = config["tool_retries"]
+retry_base_delay = config["retry_base_delay"]
+retry_max_delay = config["retry_max_delay"]
+hedge_percentile = config["hedge_percentile"]
+hedge_min_samples = config["hedge_min_samples"]
+breaker_failures = config["breaker_failures"]
+breaker_reset = config["breaker_reset"]
+tool_error_pattern = re.compile(config["tool_error_pattern"], re.IGNORECASE)
+tool_fallback = config["tool_fallback"]
+llm_fallback = config["llm_fallback"]
+
+T = TypeVar("T")
+
+
+class ToolError(Exception):
+    """Tool returned an error result saying its backend is unavailable"""
+
+
+async def retry(
+    fn: Callable[[], Awaitable[T]],
+    attempts: int,
+    base_delay: float = retry_base_delay,
+    max_delay: float = retry_max_delay,
+) -> T:
+    """Call fn until it succeeds, with exponential backoff and jitter"""
+    for attempt in range(attempts):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = min(max_delay, base_delay * 2**attempt) * random.uniform(0.5, 1)
+            print(f"Retrying in {delay:.1f}s after error: {e!r}")
+            await asyncio.sleep(delay)
+    raise ValueError("attempts must be at least 1")
+
+
+class CircuitBreaker:
+    """Fails fast after repeated failures until `reset_timeout` has passed.
+
+    After the timeout one trial call is let through, its result closes the
+    breaker again or keeps it open for another timeout.
+    """
+
+    def __init__(
+        self, max_failures: int = breaker_failures, reset_timeout: float = breaker_reset
+    ):
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial = False
+
+    @property
+    def open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.trial or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self.trial = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial = False
+        if self.opened_at is not None or self.failures >= self.max_failures:
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End call without a result, e.g. when it was cancelled"""
+        self.trial = False
+
+
+class LatencyTracker:
+    """Recent latencies for percentile thresholds"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> float:
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def _close(task: asyncio.Task, stream: AsyncIterator) -> None:
+    task.cancel()
+    with suppress(BaseException):
+        await task
+    with suppress(Exception):
+        await stream.aclose()  # type: ignore
+
+
+async def hedged_stream(
+    open_stream: Callable[[], Awaitable[AsyncIterator[T]]],
+    tracker: LatencyTracker,
+    percentile: float = hedge_percentile,
+    min_samples: int = hedge_min_samples,
+    first_timeout: float = first_chunk_timeout,
+    next_timeout: float = chunk_timeout,
+) -> AsyncIterator[T]:
+    """Stream from open_stream with deadlines and one hedged request.
+
+    If the first chunk takes longer than the given percentile of recent
+    time-to-first-chunk, a second identical request is sent and whichever
+    answers first is used, the other one is closed.
+    """
+    start = time.monotonic()
+    hedge_at = None
+    if percentile and len(tracker) >= min_samples:
+        hedge_at = start + tracker.percentile(percentile)
+    deadline = start + first_timeout
+
+    stream = await open_stream()
+    pending = {asyncio.ensure_future(anext(stream)): stream}
+    hedged = False
+    winner = None
+    error = None
+    try:
+        while winner is None:
+            now = time.monotonic()
+            if now >= deadline:
+                raise TimeoutError("No response from model in time.")
+            wait_until = deadline
+            if hedge_at and not hedged:
+                wait_until = min(deadline, hedge_at)
+            done, _ = await asyncio.wait(
+                pending,
+                timeout=max(0, wait_until - now),
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                stream = pending.pop(task)
+                if task.exception() is None and winner is None:
+                    winner = (task.result(), stream)
+                elif task.exception() is None:
+                    await _close(task, stream)
+                else:
+                    error = task.exception()
+            if winner is not None:
+                break
+            if not pending:
+                if isinstance(error, StopAsyncIteration):
+                    return
+                raise error or TimeoutError("No response from model in time.")
+            if hedge_at and not hedged and time.monotonic() >= hedge_at:
+                print("\n[Sending hedged model request]")
+                hedged = True
+                stream = await open_stream()
+                pending[asyncio.ensure_future(anext(stream))] = stream
+    finally:
+        for task, other in pending.items():
+            await _close(task, other)
+
+    tracker.add(time.monotonic() - start)
+    first, stream = winner
+    yield first
+    while True:
+        try:
+            chunk = await asyncio.wait_for(anext(stream), next_timeout)
+        except StopAsyncIteration:
+            break
+        yield chunk
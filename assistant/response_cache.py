@@ -0,0 +1,126 @@
+import re
+import threading
+import time
+import numpy as np
+import tomllib
+
+with open("config.toml", "rb") as f:
+    config = tomllib.load(f)["response_cache"]
+
+enabled = config["enabled"]
+cache_tool_free_turns = config["cache_tool_free_turns"]
+embedding_model = config["embedding_model"]
+similarity_threshold = config["similarity_threshold"]
+ttl = config["ttl"]
+max_entries = config["max_entries"]
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(re.sub(r"[^\w\s']", " ", query.lower()).split())
+
+
+class Embedder:
+    """Small local embedding model, needs optional fastembed package"""
+
+    def __init__(self, model_name: str = embedding_model):
+        from fastembed import TextEmbedding
+
+        self.model = TextEmbedding(model_name)
+
+    def embed(self, text: str) -> np.ndarray:
+        vec = next(iter(self.model.embed([text])))
+        return vec / np.linalg.norm(vec)
+
+
+class LSHIndex:
+    """Approximate nearest neighbour index using random hyperplane hashing"""
+
+    def __init__(self, dim: int, n_tables: int = 4, n_bits: int = 8, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((n_tables, n_bits, dim))
+        self.weights = 1 << np.arange(n_bits)
+        self.tables: list[dict[int, set[int]]] = [{} for _ in range(n_tables)]
+
+    def hashes(self, vec: np.ndarray) -> list[int]:
+        bits = (self.planes @ vec) > 0
+        return [int(h) for h in bits @ self.weights]
+
+    def add(self, key: int, vec: np.ndarray) -> None:
+        for table, h in zip(self.tables, self.hashes(vec)):
+            table.setdefault(h, set()).add(key)
+
+    def remove(self, key: int, vec: np.ndarray) -> None:
+        for table, h in zip(self.tables, self.hashes(vec)):
+            table.get(h, set()).discard(key)
+
+    def query(self, vec: np.ndarray) -> set[int]:
+        """Keys sharing a bucket with vec in any table"""
+        found = set()
+        for table, h in zip(self.tables, self.hashes(vec)):
+            found |= table.get(h, set())
+        return found
+
+
+class ResponseCache:
+    """Answers of previous queries looked up by query embedding.
+
+    Each entry is tagged with the tools called to produce it, calling a tool
+    that changes data removes entries tagged with the tools it invalidates.
+    """
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        threshold: float = similarity_threshold,
+        ttl: float = ttl,
+        max_entries: int = max_entries,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.index: LSHIndex | None = None
+        # key -> (vector, answer, tags, expire time)
+        self.entries: dict[int, tuple[np.ndarray, str, set[str], float]] = {}
+        self.next_key = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, query: str) -> str | None:
+        """Return cached answer for similar query"""
+        vec = self.embedder.embed(normalize_query(query))
+        now = time.time()
+        best, best_sim = None, self.threshold
+        with self.lock:
+            if self.index is None:
+                return None
+            for key in self.index.query(vec):
+                entry_vec, answer, _, expire_time = self.entries[key]
+                if expire_time < now:
+                    self._remove(key)
+                    continue
+                sim = float(entry_vec @ vec)
+                if sim >= best_sim:
+                    best, best_sim = answer, sim
+        return best
+
+    def store(self, query: str, answer: str, tags: set[str]) -> None:
+        vec = self.embedder.embed(normalize_query(query))
+        with self.lock:
+            if self.index is None:
+                self.index = LSHIndex(len(vec))
+            if len(self.entries) >= self.max_entries:
+                self._remove(min(self.entries, key=lambda k: self.entries[k][3]))
+            key = self.next_key
+            self.next_key += 1
+            self.entries[key] = (vec, answer, tags, time.time() + self.ttl)
+            self.index.add(key, vec)
+
+    def invalidate(self, tags: set[str]) -> None:
+        """Remove entries tagged with any of the given tools"""
+        with self.lock:
+            for key in [k for k, e in self.entries.items() if e[2] & tags]:
+                self._remove(key)
+
+    def _remove(self, key: int) -> None:
+        vec = self.entries.pop(key)[0]
+        self.index.remove(key, vec)  # type: ignore
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import time
+from collections import deque
+from websockets.asyncio.server import ServerConnection, serve
+from websockets.exceptions import ConnectionClosed
+from assistant.client import MCPClient
+from assistant.transcriber import FOREGROUND, TranscriptionService
+from assistant.utils import add_to_history
+import tomllib
+
+with open("config.toml", "rb") as f:
+    config = tomllib.load(f)["server"]
+
+host = config["host"]
+port = config["port"]
+max_sessions = config["max_sessions"]
+max_pending = config["max_pending"]
+rate_limit = config["rate_limit"]
+burst = config["burst"]
+max_message_size = config["max_message_size"]
+transcribe_audio = config["transcribe_audio"]
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` requests per minute"""
+
+    def __init__(self, rate: float = rate_limit, burst: int = burst):
+        self.rate = rate / 60
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Session:
+    """Chat state of one websocket client.
+
+    Clients send text queries as {"type": "text", "text": ...} and audio as
+    binary frames of 16kHz 16-bit mono PCM, one utterance per frame. History
+    messages are sent back the same way `Assistant` broadcasts them to its
+    ws_manager, with response text streamed as {"type": "chunk"} messages.
+    """
+
+    def __init__(
+        self,
+        websocket: ServerConnection,
+        client: MCPClient,
+        transcriber: TranscriptionService | None,
+    ):
+        self.websocket = websocket
+        self.client = client
+        self.transcriber = transcriber
+        self.chat = client.new_chat()
+        self.conversation_history = deque(maxlen=100)
+        self.requests = asyncio.Queue(maxsize=max_pending)
+        self.limiter = RateLimiter()
+
+    async def send(self, message: dict) -> None:
+        await self.websocket.send(json.dumps(message))
+
+    async def broadcast(self, message: dict) -> None:
+        """ws_manager interface used for history messages"""
+        await self.send({"type": "message", **message})
+
+    async def add_to_history(self, role: str, content: str) -> None:
+        """Same history handling as `Assistant`, with session as its ws_manager"""
+        await add_to_history(self.conversation_history, role, content, ws_manager=self)
+
+    async def receive(self) -> None:
+        """Queue incoming requests, rejecting them when over limits"""
+        async for data in self.websocket:
+            if not self.limiter.allow():
+                await self.send({"type": "error", "error": "Rate limit exceeded."})
+                continue
+            try:
+                self.requests.put_nowait(data)
+            except asyncio.QueueFull:
+                await self.send(
+                    {"type": "error", "error": "Too many pending requests."}
+                )
+
+    async def get_query(self, data: str | bytes) -> str | None:
+        """Get query text from text message or audio frame"""
+        if isinstance(data, bytes):
+            if self.transcriber is None:
+                raise Exception("Audio is not supported by this server.")
+            future = self.transcriber.submit(data, FOREGROUND)
+            return (await asyncio.wrap_future(future)).strip()
+        message = json.loads(data)
+        if message.get("type") != "text":
+            raise Exception(f"Unknown message type: {message.get('type')}")
+        return message["text"].strip()
+
+    async def process_requests(self) -> None:
+        """Process queued requests one at a time"""
+        while True:
+            data = await self.requests.get()
+            try:
+                query = await self.get_query(data)
+                if query:
+                    await self.process_query(query)
+                else:
+                    # e.g. silence, nothing to answer but client waits for turn end
+                    await self.send({"type": "done"})
+            except ConnectionClosed:
+                return
+            except Exception as e:
+                await self.send({"type": "error", "error": str(e)})
+
+    async def process_query(self, query: str) -> None:
+        """Stream response to client and add turn to history"""
+        await self.add_to_history("user", query)
+        full_text = ""
+        async for chunk in self.client.process_query(query, self.chat):
+            if chunk:
+                full_text += chunk
+                await self.send({"type": "chunk", "text": chunk})
+        await self.add_to_history("assistant", full_text)
+        await self.send({"type": "done"})
+
+    async def run(self) -> None:
+        worker = asyncio.create_task(self.process_requests())
+        try:
+            await self.receive()
+        except ConnectionClosed:
+            pass
+        finally:
+            worker.cancel()
+
+
+class HeadlessServer:
+    """Websocket server sharing one model client, MCP servers and whisper worker"""
+
+    def __init__(
+        self, client: MCPClient, transcriber: TranscriptionService | None = None
+    ):
+        self.client = client
+        self.transcriber = transcriber
+        self.sessions: set[Session] = set()
+
+    async def handler(self, websocket: ServerConnection) -> None:
+        if len(self.sessions) >= max_sessions:
+            await websocket.close(1013, "Server is busy.")
+            return
+        session = Session(websocket, self.client, self.transcriber)
+        self.sessions.add(session)
+        try:
+            await session.run()
+        finally:
+            self.sessions.discard(session)
+
+    async def serve(self) -> None:
+        async with serve(self.handler, host, port, max_size=max_message_size) as server:
+            print(f"Serving on ws://{host}:{port}")
+            await server.serve_forever()
+
+
+async def main() -> None:
+    client = MCPClient()
+    transcriber = TranscriptionService() if transcribe_audio else None
+    try:
+        await client.connect_to_server()
+        await client.init_chat()
+        if transcriber:
+            await asyncio.to_thread(transcriber.start)
+        await HeadlessServer(client, transcriber).serve()
+    finally:
+        if transcriber:
+            transcriber.stop()
+        await client.cleanup()
+
+
+if __name__ == "__main__":
+    import sys
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+        sys.exit(0)
@@ -0,0 +1,115 @@
+import base64
+import json
+import math
+import mimetypes
+from google.genai import types
+from assistant.utils import is_b64
+import tomllib
+
+with open("config.toml", "rb") as f:
+    config = tomllib.load(f)["client"]
+
+default_max_tokens = config["tool_result_max_tokens"]
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(value) -> int:
+    """Rough token count of value as it is sent to the model"""
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def keep_fields(value, keep: list[str]):
+    """Keep only given keys of a dict or of each dict in a list"""
+    if isinstance(value, list):
+        return [keep_fields(v, keep) for v in value]
+    if isinstance(value, dict):
+        return {k: value[k] for k in keep if k in value}
+    return value
+
+
+def cap_strings(value, max_len: int):
+    """Shorten every string in value to max_len characters"""
+    if isinstance(value, str):
+        return value if len(value) <= max_len else value[:max_len] + "..."
+    if isinstance(value, list):
+        return [cap_strings(v, max_len) for v in value]
+    if isinstance(value, dict):
+        return {k: cap_strings(v, max_len) for k, v in value.items()}
+    return value
+
+
+def longest_string(value) -> int:
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, list):
+        return max((longest_string(v) for v in value), default=0)
+    if isinstance(value, dict):
+        return max((longest_string(v) for v in value.values()), default=0)
+    return 0
+
+
+def truncate(value, max_tokens: int) -> str:
+    """Serialize value, shortening its longest strings to fit max_tokens"""
+    if isinstance(value, str):
+        text = value
+    else:
+        text = json.dumps(value, ensure_ascii=False)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if isinstance(value, (list, dict)):
+        # largest string length that still fits
+        lo, hi = 0, longest_string(value)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            capped = json.dumps(cap_strings(value, mid), ensure_ascii=False)
+            if len(capped) <= max_chars:
+                lo = mid
+            else:
+                hi = mid - 1
+        text = json.dumps(cap_strings(value, lo), ensure_ascii=False)
+    if len(text) > max_chars:
+        text = text[:max_chars] + "..."
+    return text
+
+
+def inline_part(args: dict, result, options: dict) -> types.Part | None:
+    """Binary part for base64 tool result, None if it can't be sent inline"""
+    if not isinstance(result, str) or not is_b64(result.encode()):
+        return None
+    mime_type = options.get("mime_type")
+    if not mime_type and options.get("mime_arg"):
+        mime_type, _ = mimetypes.guess_type(str(args.get(options["mime_arg"], "")))
+    if not mime_type:
+        return None
+    return types.Part.from_bytes(data=base64.b64decode(result), mime_type=mime_type)
+
+
+def shape_result(name: str, args: dict, result, options: dict) -> list[types.Part]:
+    """Turn tool result into message parts for the model.
+
+    Args:
+        name: Tool name
+        args: Arguments tool was called with
+        result: Tool result or error message
+        options: Per tool settings from server config
+            keep: keys to keep from result dicts
+            max_tokens: token budget of text result
+            inline: send base64 result as binary part
+            mime_type / mime_arg: mime type, or argument holding file name
+    """
+    before = estimate_tokens(result)
+    if options.get("inline") and (part := inline_part(args, result, options)):
+        mime_type = part.inline_data.mime_type  # type: ignore
+        text = f"Tool_name: {name}, Tool_response: attached {mime_type} data"
+        print(f"\n[Tool {name}: ~{before} tokens -> inline {mime_type}]")
+        return [types.Part(text=text), part]
+
+    if options.get("keep"):
+        result = keep_fields(result, options["keep"])
+    shaped = truncate(result, options.get("max_tokens", default_max_tokens))
+    text = f"Tool_name: {name}, Tool_response: {shaped}"
+    print(f"\n[Tool {name}: ~{before} tokens -> ~{estimate_tokens(shaped)} tokens]")
+    return [types.Part(text=text)]
@@ -0,0 +1,369 @@
+import multiprocessing as mp
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from queue import Empty, Full
+import tomllib
+
+with open("config.toml", "rb") as f:
+    toml = tomllib.load(f)
+config = toml["assistant"]
+# Written by `python -m assistant.autotune`
+profile = toml.get("whisper_profile", {})
+
+whisper_model = config["whisper_model"]
+start_word = config["start_word"]
+queue_size = config.get("transcriber_queue_size", 8)
+batch_window_ms = config.get("batch_window_ms", 0)
+max_batch = config.get("max_batch", 8)
+
+DEFAULT_BEAM_SIZE = 5
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+# Job priorities
+FOREGROUND = 0
+WAKE_WORD = 1
+
+
+def get_device() -> str:
+    """Return device whisper model will run on"""
+    import torch
+
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def device_profile(profile: dict = profile) -> dict:
+    """Return tuned profile, empty if it was tuned for a different device"""
+    return profile if profile.get("device") == get_device() else {}
+
+
+def load_model(model_path: str, profile: dict = profile):
+    """Load whisper model on the best available device
+
+    Args:
+        model_path: Path to whisper model or model name
+        profile: Tuned compute_type and cpu_threads, ignored if it was tuned
+            for a different device
+    """
+    from faster_whisper import WhisperModel
+
+    device = get_device()
+    profile = device_profile(profile)
+    compute_type = profile.get("compute_type", "default")
+
+    if device == "cuda":
+        print("Using cuda")
+        return WhisperModel(
+            model_size_or_path=model_path, device="cuda", compute_type=compute_type
+        )
+    num_cores = os.cpu_count()
+    if not num_cores:
+        num_cores = 8
+    return WhisperModel(
+        model_size_or_path=model_path,
+        device="cpu",
+        compute_type=compute_type,
+        cpu_threads=profile.get("cpu_threads", num_cores // 2),
+        num_workers=num_cores // 2,
+    )
+
+
+def transcribe_audio(model, audio, beam_size: int = DEFAULT_BEAM_SIZE) -> str:
+    """Recognize text from audio file or 16kHz float32 waveform"""
+    segs, _ = model.transcribe(
+        audio,
+        beam_size=beam_size,
+        language="en",
+        condition_on_previous_text=False,
+        log_prob_threshold=0.4,
+        no_speech_threshold=0.5,
+        hotwords=f"{start_word}",
+    )
+    return "".join([s.text for s in segs])
+
+
+def transcribe_batch(
+    model, pipeline, audios: list, beam_size: int = DEFAULT_BEAM_SIZE
+) -> list[str]:
+    """Recognize text from several 16kHz float32 waveforms in one batched pass.
+
+    The pipeline joins consecutive clip timestamps into chunks of up to
+    whisper's 30 second window. Each utterance is zero padded to just over
+    half the window, so no two of them fit in one chunk and every utterance
+    is decoded as its own batch item.
+    """
+    import numpy as np
+
+    slot = model.feature_extractor.chunk_length / 2 + 0.5
+    slot_samples = int(slot * SAMPLE_RATE)
+    if len(audios) == 1 or any(len(a) > slot_samples for a in audios):
+        return [transcribe_audio(model, a, beam_size) for a in audios]
+
+    padded = np.zeros(slot_samples * len(audios), dtype=np.float32)
+    clips = []
+    for i, audio in enumerate(audios):
+        padded[i * slot_samples : i * slot_samples + len(audio)] = audio
+        clips.append({"start": i * slot, "end": (i + 1) * slot})
+    segs, _ = pipeline.transcribe(
+        padded,
+        beam_size=beam_size,
+        language="en",
+        log_prob_threshold=0.4,
+        no_speech_threshold=0.5,
+        hotwords=f"{start_word}",
+        clip_timestamps=clips,
+        batch_size=len(audios),
+    )
+    texts = [""] * len(audios)
+    for s in segs:
+        texts[min(int((s.start + 0.01) // slot), len(audios) - 1)] += s.text
+    return texts
+
+
+def _worker(model_path: str, jobs, results) -> None:
+    """Worker process loop, reads PCM from shared memory and transcribes it"""
+    import numpy as np
+    from faster_whisper import BatchedInferencePipeline
+
+    tuned = device_profile()
+    model = load_model(model_path, tuned)
+    beam_size = tuned.get("beam_size", DEFAULT_BEAM_SIZE)
+    pipeline = BatchedInferencePipeline(model)
+    results.put(None)
+    while True:
+        batch = jobs.get()
+        if batch is None:
+            break
+        batch_id, shm_name, items = batch
+        try:
+            shm = shared_memory.SharedMemory(name=shm_name, track=False)
+            try:
+                audios = []
+                for _, offset, size in items:
+                    pcm = np.ndarray(
+                        (size // SAMPLE_WIDTH,),
+                        dtype=np.int16,
+                        buffer=shm.buf,
+                        offset=offset,
+                    )
+                    audios.append(pcm.astype(np.float32) / 32768.0)
+                    del pcm
+            finally:
+                shm.close()
+            texts = transcribe_batch(model, pipeline, audios, beam_size)
+            results.put((batch_id, [(i[0], t, None) for i, t in zip(items, texts)]))
+        except Exception as e:
+            results.put((batch_id, [(i[0], None, str(e)) for i in items]))
+
+
+class TranscriptionService:
+    """Whisper model running in a dedicated process.
+
+    Jobs are queued by priority: foreground utterances are always sent to the
+    worker before wake word checks. The queue is bounded, when it is full the
+    oldest wake word check is dropped. Jobs arriving within `batch_window_ms`
+    of each other are transcribed together in one batch.
+    """
+
+    def __init__(
+        self,
+        model_path: str = whisper_model,
+        max_jobs: int = queue_size,
+        batch_window_ms: float = batch_window_ms,
+        max_batch: int = max_batch,
+    ):
+        self.model_path = model_path
+        self.max_jobs = max_jobs
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.started = False
+        self._foreground = deque()
+        self._wake = deque()
+        self._cond = threading.Condition()
+        self._ctx = mp.get_context("spawn")
+        self._jobs = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._process = None
+        self._dispatcher = None
+        self._next_id = 0
+        self._batch_id = 0
+        self._queue_times = deque(maxlen=500)
+        self._batches = 0
+        self._utterances = 0
+        self._audio_secs = 0.0
+        self._busy_secs = 0.0
+
+    def start(self) -> None:
+        """Start worker process and wait until model is loaded"""
+        if self.started:
+            return
+        self._process = self._ctx.Process(
+            target=_worker,
+            args=(self.model_path, self._jobs, self._results),
+            daemon=True,
+        )
+        self._process.start()
+        while True:
+            try:
+                self._results.get(timeout=1)
+                break
+            except Empty:
+                if not self._process.is_alive():
+                    self._process = None
+                    raise RuntimeError("Transcription worker died loading model.")
+        self.started = True
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def stop(self) -> None:
+        """Cancel pending jobs and stop worker process"""
+        if not self.started:
+            return
+        with self._cond:
+            self.started = False
+            for _, _, future, _ in (*self._foreground, *self._wake):
+                future.cancel()
+            self._foreground.clear()
+            self._wake.clear()
+            self._cond.notify_all()
+        self._jobs.put(None)
+        if self._dispatcher:
+            self._dispatcher.join()
+        if self._process:
+            self._process.join(timeout=5)
+        if self._batches:
+            self.report()
+
+    def submit(self, pcm: bytes, priority: int = FOREGROUND) -> Future:
+        """Queue 16kHz 16-bit mono PCM for transcription"""
+        future = Future()
+        with self._cond:
+            if not self.started:
+                raise RuntimeError("Transcription service is not started.")
+            if len(self._foreground) + len(self._wake) >= self.max_jobs:
+                if self._wake:
+                    self._wake.popleft()[2].cancel()
+                elif priority == WAKE_WORD:
+                    future.cancel()
+                    return future
+                else:
+                    raise Full("Transcription queue is full.")
+            self._next_id += 1
+            job = (self._next_id, pcm, future, time.perf_counter())
+            if priority == FOREGROUND:
+                self._foreground.append(job)
+            else:
+                self._wake.append(job)
+            self._cond.notify()
+        return future
+
+    def transcribe(self, pcm: bytes, priority: int = FOREGROUND) -> str:
+        """Transcribe PCM and wait for result"""
+        return self.submit(pcm, priority).result()
+
+    def stats(self) -> dict:
+        """Batching throughput and queueing latency"""
+        queue_times = sorted(self._queue_times)
+        return {
+            "batches": self._batches,
+            "utterances": self._utterances,
+            "mean_batch_size": self._utterances / max(self._batches, 1),
+            "utterances_per_sec": self._utterances / max(self._busy_secs, 1e-9),
+            "audio_secs_per_sec": self._audio_secs / max(self._busy_secs, 1e-9),
+            "mean_queue_ms": 1000 * sum(queue_times) / max(len(queue_times), 1),
+            "p95_queue_ms": (
+                1000 * queue_times[int(len(queue_times) * 0.95)]
+                if queue_times
+                else 0.0
+            ),
+        }
+
+    def report(self) -> None:
+        s = self.stats()
+        print(
+            f"Transcription: {s['batches']} batches, mean size"
+            f" {s['mean_batch_size']:.2f}, {s['utterances_per_sec']:.2f} utterances/s,"
+            f" {s['audio_secs_per_sec']:.1f}x realtime, queueing"
+            f" {s['mean_queue_ms']:.0f} ms mean / {s['p95_queue_ms']:.0f} ms p95"
+        )
+
+    def _next_batch(self) -> list | None:
+        """Wait for jobs and collect a batch, foreground jobs first"""
+        with self._cond:
+            while self.started and not (self._foreground or self._wake):
+                self._cond.wait()
+            deadline = time.perf_counter() + self.batch_window
+            while self.started:
+                pending = len(self._foreground) + len(self._wake)
+                remaining = deadline - time.perf_counter()
+                if pending >= self.max_batch or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if not self.started:
+                return None
+            batch = []
+            while len(batch) < self.max_batch and (self._foreground or self._wake):
+                queue = self._foreground if self._foreground else self._wake
+                batch.append(queue.popleft())
+            return batch
+
+    def _dispatch(self) -> None:
+        """Send batches of queued jobs to worker"""
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            batch = [job for job in batch if job[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            for job in batch:
+                self._queue_times.append(start - job[3])
+            size = sum(len(job[1]) for job in batch)
+            shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+            try:
+                items = []
+                offset = 0
+                for job_id, pcm, _, _ in batch:
+                    shm.buf[offset : offset + len(pcm)] = pcm
+                    items.append((job_id, offset, len(pcm)))
+                    offset += len(pcm)
+                self._batch_id += 1
+                self._jobs.put((self._batch_id, shm.name, items))
+                results = self._wait_result(self._batch_id)
+            except Exception as e:
+                results = [(job[0], None, str(e)) for job in batch]
+            finally:
+                shm.close()
+                shm.unlink()
+
+            self._batches += 1
+            self._utterances += len(batch)
+            self._audio_secs += size / (SAMPLE_RATE * SAMPLE_WIDTH)
+            self._busy_secs += time.perf_counter() - start
+            if self._batches % 100 == 0:
+                self.report()
+
+            for (_, _, future, _), (_, text, error) in zip(batch, results):
+                if error is not None:
+                    future.set_exception(RuntimeError(error))
+                else:
+                    future.set_result(text)
+
+    def _wait_result(self, batch_id: int) -> list[tuple]:
+        """Wait for results of given batch from worker"""
+        while True:
+            try:
+                res_id, results = self._results.get(timeout=1)
+            except Empty:
+                if self._process and not self._process.is_alive():
+                    raise RuntimeError("Transcription worker died.")
+                continue
+            if res_id == batch_id:
+                return results
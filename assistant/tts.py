@@ -0,0 +1,256 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import wave
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import NamedTuple
+import tomllib
+
+with open("config.toml", "rb") as f:
+    config = tomllib.load(f)["tts"]
+
+cache_dir = config["cache_dir"]
+cache_size = config["cache_size"]
+min_count = config["min_count"]
+phrases = config["phrases"]
+
+
+class Audio(NamedTuple):
+    pcm: bytes
+    sample_rate: int
+    channels: int
+    sample_width: int
+
+
+def read_audio(path: str) -> Audio:
+    """Read PCM from wav file, or aiff file written by macOS driver"""
+    try:
+        with wave.open(path, "rb") as w:
+            return Audio(
+                w.readframes(w.getnframes()),
+                w.getframerate(),
+                w.getnchannels(),
+                w.getsampwidth(),
+            )
+    except wave.Error:
+        return decode_audio(path)
+
+
+def decode_audio(path: str) -> Audio:
+    """Decode any audio file to 16-bit PCM with PyAV, installed with faster-whisper"""
+    import av
+
+    with av.open(path) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(
+            format="s16", layout=stream.layout, rate=stream.rate
+        )
+        frames = []
+        for frame in container.decode(stream):
+            frames.extend(resampler.resample(frame))
+        frames.extend(resampler.resample(None))
+    return Audio(
+        b"".join(f.to_ndarray().tobytes() for f in frames),
+        stream.rate,
+        len(stream.layout.channels),
+        2,
+    )
+
+
+def write_audio(path: str, audio: Audio) -> None:
+    """Write PCM to wav file"""
+    with wave.open(path, "wb") as w:
+        w.setnchannels(audio.channels)
+        w.setsampwidth(audio.sample_width)
+        w.setframerate(audio.sample_rate)
+        w.writeframes(audio.pcm)
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class TTSBackend(ABC):
+    """Renders text to PCM and plays it"""
+
+    @abstractmethod
+    def settings(self) -> tuple:
+        """Voice settings that change rendered audio"""
+
+    @abstractmethod
+    def render(self, text: str) -> Audio: ...
+
+    @abstractmethod
+    def play(self, audio: Audio) -> None: ...
+
+
+class Pyttsx3Backend(TTSBackend):
+    """pyttsx3 rendering with pyaudio playback"""
+
+    def __init__(
+        self,
+        voice: str | None = None,
+        rate: int | None = None,
+        volume: float | None = None,
+    ):
+        import pyttsx3
+
+        self.engine = pyttsx3.init()
+        if voice is not None:
+            self.engine.setProperty("voice", voice)
+        if rate is not None:
+            self.engine.setProperty("rate", rate)
+        if volume is not None:
+            self.engine.setProperty("volume", volume)
+        self.lock = threading.Lock()
+        self.pa = None
+
+    def settings(self) -> tuple:
+        return (
+            self.engine.getProperty("voice"),
+            self.engine.getProperty("rate"),
+            self.engine.getProperty("volume"),
+        )
+
+    def render(self, text: str) -> Audio:
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            with self.lock:
+                self.engine.save_to_file(text, path)
+                self.engine.runAndWait()
+            return read_audio(path)
+        finally:
+            os.remove(path)
+
+    def play(self, audio: Audio) -> None:
+        import pyaudio
+
+        if self.pa is None:
+            self.pa = pyaudio.PyAudio()
+        stream = self.pa.open(
+            format=self.pa.get_format_from_width(audio.sample_width),
+            channels=audio.channels,
+            rate=audio.sample_rate,
+            output=True,
+        )
+        try:
+            stream.write(audio.pcm)
+        finally:
+            stream.stop_stream()
+            stream.close()
+
+
+class PhraseCache:
+    """LRU cache of rendered audio, persisted as wav files.
+
+    Files found on start are entries whose audio is read on first use. Files
+    of entries dropped from the cache are deleted, so at most `max_items`
+    files are kept on disk.
+    """
+
+    def __init__(
+        self, backend: TTSBackend, max_items: int = cache_size, path: str = cache_dir
+    ):
+        self.backend = backend
+        self.max_items = max_items
+        self.path = path
+        # key -> audio, None until file is read
+        self.items: OrderedDict[str, Audio | None] = OrderedDict()
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        files = [f for f in os.listdir(path) if f.endswith(".wav")]
+        files.sort(key=lambda f: os.path.getmtime(os.path.join(path, f)))
+        for file in files:
+            self._add(file.removesuffix(".wav"), None)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.wav")
+
+    def key(self, text: str) -> str:
+        """Key from normalized text and voice settings"""
+        raw = repr((normalize(text), self.backend.settings()))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def get(self, text: str) -> Audio | None:
+        key = self.key(text)
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            audio = self.items[key]
+        if audio is None:
+            try:
+                audio = read_audio(self._file(key))
+            except FileNotFoundError:
+                return None
+            with self.lock:
+                if key in self.items:
+                    self.items[key] = audio
+        return audio
+
+    def put(self, text: str, audio: Audio) -> None:
+        key = self.key(text)
+        write_audio(self._file(key), audio)
+        self._add(key, audio)
+
+    def _add(self, key: str, audio: Audio | None) -> None:
+        with self.lock:
+            self.items[key] = audio
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                old_key, _ = self.items.popitem(last=False)
+                try:
+                    os.remove(self._file(old_key))
+                except FileNotFoundError:
+                    pass
+
+
+class Speaker:
+    """Speaks text, playing cached audio for fixed and frequent phrases"""
+
+    def __init__(
+        self,
+        backend: TTSBackend | None = None,
+        cache: PhraseCache | None = None,
+        phrases: list[str] = phrases,
+        min_count: int = min_count,
+    ):
+        self.backend = backend or Pyttsx3Backend(
+            config.get("voice"), config.get("rate"), config.get("volume")
+        )
+        self.cache = cache or PhraseCache(self.backend)
+        self.phrases = phrases
+        self.min_count = min_count
+        self.counts = Counter()
+
+    def warm(self) -> None:
+        """Render configured phrases that are not cached yet"""
+        for phrase in self.phrases:
+            if self.cache.get(phrase) is None:
+                self.cache.put(phrase, self.backend.render(phrase))
+
+    def speak(self, text: str) -> None:
+        """Play text sentence by sentence, cached ones from memory"""
+        for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+            if not sentence:
+                continue
+            audio = self.cache.get(sentence)
+            if audio is None:
+                audio = self.render(sentence)
+            self.backend.play(audio)
+
+    def render(self, sentence: str) -> Audio:
+        """Render sentence, caching it once it was rendered min_count times"""
+        audio = self.backend.render(sentence)
+        norm = normalize(sentence)
+        if len(self.counts) > 1000:
+            self.counts.clear()
+        self.counts[norm] += 1
+        if self.counts[norm] >= self.min_count:
+            self.cache.put(sentence, audio)
+            del self.counts[norm]
+        return audio
@@ -1,5 +1,6 @@
 import re
 import base64
+from datetime import datetime
 
 
 def get_query(query, word):
@@ -16,3 +17,36 @@ def is_b64(data):
         return base64.b64encode(base64.b64decode(data)) == data
     except Exception:
         return False
+
+
+def normalize_text(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    ref = normalize_text(reference)
+    hyp = normalize_text(hypothesis)
+    if not ref:
+        return float(bool(hyp))
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        curr = [i]
+        for j, h in enumerate(hyp, 1):
+            curr.append(min(prev[j] + 1, curr[j - 1] + 1, prev[j - 1] + (r != h)))
+        prev = curr
+    return prev[-1] / len(ref)
+
+
+async def add_to_history(history, role, content, message_queue=None, ws_manager=None):
+    """Add message to history, queue it for UI and broadcast it to ws_manager"""
+    message = {
+        "role": role,
+        "content": content,
+        "timestamp": datetime.now().isoformat(),
+    }
+    history.append(message)
+    if message_queue is not None:
+        message_queue.put(message)
+    if ws_manager:
+        await ws_manager.broadcast(message)
+    return message
@@ -31,6 +31,7 @@ async def main() -> None:
         await asyncio.Event().wait()
 
     finally:
+        assistant.transcriber.stop()
         await client.cleanup()
 
 
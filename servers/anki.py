@@ -10,12 +10,13 @@ mcp = FastMCP("anki")
 
 BASE_URL = "http://127.0.0.1:8765"
 USER_AGENT = "anki-app/1.0"
+TIMEOUT = 10.0  # seconds, fail tool call instead of hanging on AnkiConnect
 
 
 async def invoke(action, method="GET", **params):
     req_json = {"action": action, "params": params, "version": 6}
 
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(timeout=TIMEOUT) as client:
         try:
             response = await client.request(method, BASE_URL, json=req_json)
             response.raise_for_status()
@@ -29,6 +30,8 @@ async def invoke(action, method="GET", **params):
             if response["error"] is not None:
                 raise Exception(response["error"])
             return response["result"]
+        except httpx.TransportError as e:
+            raise Exception(f"AnkiConnect is unavailable: {e!r}")
         except Exception as e:
             raise e
 
@@ -0,0 +1,147 @@
+import os
+import time
+import unittest
+from mcp import types as mcp_types
+from assistant.context_cache import CacheBackend, ContextCache, gemini_tools
+
+
+def make_tool(name: str) -> mcp_types.Tool:
+    return mcp_types.Tool(
+        name=name,
+        description=f"{name} tool",
+        inputSchema={"type": "object", "properties": {"deck": {"type": "string"}}},
+    )
+
+
+class FakeCacheBackend(CacheBackend):
+    """Local stand-in for Gemini context caching"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.created: list[tuple[str, list[str]]] = []
+        self.deleted: list[str] = []
+
+    async def create(self, model, system_instruction, tools, ttl):
+        if self.fail:
+            raise Exception("Cached content is too small.")
+        name = f"cachedContents/{len(self.created)}"
+        self.created.append((name, [t.name for t in tools]))
+        return name, time.time() + ttl
+
+    async def delete(self, name):
+        self.deleted.append(name)
+
+
+class ContextCacheTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = FakeCacheBackend()
+        self.cache = ContextCache(
+            self.backend, "model", "instruction", ttl=600, refresh_margin=60
+        )
+        self.tools = [make_tool("get_deck_names")]
+
+    async def get(self, tools) -> str | None:
+        """Get cache name after background refresh has finished"""
+        await self.cache.get(tools)
+        if self.cache.task:
+            await self.cache.task
+        return await self.cache.get(tools)
+
+    async def test_created_in_background(self):
+        self.assertIsNone(await self.cache.get(self.tools))
+        await self.cache.task  # type: ignore
+        self.assertEqual(await self.cache.get(self.tools), "cachedContents/0")
+        self.assertEqual(await self.cache.get(self.tools), "cachedContents/0")
+        self.assertEqual(len(self.backend.created), 1)
+
+    async def test_refreshes_before_expiry(self):
+        await self.get(self.tools)
+        self.cache.expire_time = time.time() + 30  # inside refresh margin
+        # old cache is used while new one is created
+        self.assertEqual(await self.cache.get(self.tools), "cachedContents/0")
+        await self.cache.task  # type: ignore
+        self.assertEqual(await self.cache.get(self.tools), "cachedContents/1")
+        self.assertEqual(self.backend.deleted, [])
+
+    async def test_tool_change_recreates_and_deletes_old(self):
+        await self.get(self.tools)
+        tools = [*self.tools, make_tool("answer_card")]
+        self.assertIsNone(await self.cache.get(tools))
+        await self.cache.task  # type: ignore
+        self.assertEqual(await self.cache.get(tools), "cachedContents/1")
+        self.assertEqual(self.backend.created[1][1], ["get_deck_names", "answer_card"])
+        self.assertEqual(self.backend.deleted, ["cachedContents/0"])
+
+    async def test_falls_back_when_create_fails(self):
+        self.backend.fail = True
+        self.assertIsNone(await self.get(self.tools))
+        # not retried until ttl has passed
+        self.backend.fail = False
+        self.assertIsNone(await self.get(self.tools))
+        self.assertEqual(self.backend.created, [])
+        self.cache.retry_time = 0
+        self.assertEqual(await self.get(self.tools), "cachedContents/0")
+
+    async def test_invalidate_recreates(self):
+        await self.get(self.tools)
+        self.cache.invalidate()
+        self.assertIsNone(await self.cache.get(self.tools))
+        await self.cache.task  # type: ignore
+        self.assertEqual(await self.cache.get(self.tools), "cachedContents/1")
+
+    async def test_delete(self):
+        await self.get(self.tools)
+        await self.cache.delete()
+        self.assertIsNone(self.cache.name)
+        self.assertEqual(self.backend.deleted, ["cachedContents/0"])
+
+
+class FakeChat:
+    """Chat whose requests with cached content fail"""
+
+    def __init__(self):
+        self.configs = []
+
+    async def send_message_stream(self, message, config=None):
+        self.configs.append(config)
+
+        async def stream():
+            if config.cached_content:
+                raise Exception("403 CachedContent not found")
+            yield "answer"
+
+        return stream()
+
+
+class ClientFallbackTest(unittest.IsolatedAsyncioTestCase):
+    async def test_resends_inline_when_cached_request_fails(self):
+        os.environ.setdefault("GOOGLE_API_KEY", "test")
+        from assistant.client import MCPClient
+
+        client = MCPClient()
+        client.context_cache = ContextCache(FakeCacheBackend(), "model", "instruction")
+        client.mcp_tools = [make_tool("get_deck_names")]
+        await client.init_chat()
+        await client.get_config()
+        await client.context_cache.task  # type: ignore
+        chat = FakeChat()
+
+        response = await client.get_response("hi", chat)
+        self.assertEqual([chunk async for chunk in response], ["answer"])
+        self.assertEqual(chat.configs[0].cached_content, "cachedContents/0")
+        self.assertIs(chat.configs[1], client.mcp_config)
+        self.assertIsNone(client.context_cache.name)
+
+
+class GeminiToolsTest(unittest.TestCase):
+    def test_declarations(self):
+        tool = make_tool("get_deck_names")
+        (converted,) = gemini_tools([tool])
+        (declaration,) = converted.function_declarations  # type: ignore
+        self.assertEqual(declaration.name, "get_deck_names")
+        self.assertEqual(declaration.description, "get_deck_names tool")
+        self.assertEqual(declaration.parameters_json_schema, tool.inputSchema)
+
+
+if __name__ == "__main__":
+    unittest.main()
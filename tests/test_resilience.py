@@ -0,0 +1,274 @@
+import asyncio
+import os
+import time
+import unittest
+from types import SimpleNamespace
+from assistant import resilience
+from assistant.resilience import CircuitBreaker, LatencyTracker, hedged_stream, retry
+
+
+class FakeStream:
+    """Model response stream with injected delays and errors"""
+
+    def __init__(
+        self,
+        chunks: list[str],
+        first_delay: float = 0,
+        stall_after: int | None = None,
+        error: Exception | None = None,
+    ):
+        self.chunks = chunks
+        self.first_delay = first_delay
+        self.stall_after = stall_after
+        self.error = error
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self.sent == 0:
+            await asyncio.sleep(self.first_delay)
+        if self.error:
+            raise self.error
+        if self.sent == self.stall_after:
+            await asyncio.sleep(3600)
+        if self.sent == len(self.chunks):
+            raise StopAsyncIteration
+        self.sent += 1
+        return self.chunks[self.sent - 1]
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+class FakeToolServer:
+    """MCP server connection that hangs, fails or returns errors"""
+
+    def __init__(
+        self, fail_times: int = 0, hang: bool = False, error: str | None = None
+    ):
+        self.name = "fakeServer"
+        self.fail_times = fail_times
+        self.hang = hang
+        self.error = error
+        self.calls = 0
+
+    async def call_tool(self, name: str, args: dict):
+        self.calls += 1
+        if self.hang:
+            await asyncio.sleep(3600)
+        if self.calls <= self.fail_times:
+            raise ConnectionError("server crashed")
+        if self.error:
+            # how FastMCP reports an exception raised by the tool
+            text = f"Error executing tool {name}: {self.error}"
+            return SimpleNamespace(isError=True, content=[SimpleNamespace(text=text)])
+        return SimpleNamespace(isError=False, structuredContent={"result": "ok"})
+
+
+def opener(*streams: FakeStream):
+    """open_stream callable returning given streams in order"""
+    remaining = list(streams)
+
+    async def open_stream():
+        return remaining.pop(0)
+
+    return open_stream
+
+
+async def collect(stream) -> list[str]:
+    return [chunk async for chunk in stream]
+
+
+class RetryTest(unittest.IsolatedAsyncioTestCase):
+    async def test_succeeds_after_failures(self):
+        server = FakeToolServer(fail_times=2)
+        result = await retry(lambda: server.call_tool("t", {}), 3, 0.001, 0.002)
+        self.assertEqual(result.structuredContent["result"], "ok")
+        self.assertEqual(server.calls, 3)
+
+    async def test_raises_last_error(self):
+        server = FakeToolServer(fail_times=5)
+        with self.assertRaises(ConnectionError):
+            await retry(lambda: server.call_tool("t", {}), 3, 0.001, 0.002)
+        self.assertEqual(server.calls, 3)
+
+    async def test_retries_hanging_call_with_timeout(self):
+        server = FakeToolServer(hang=True)
+        with self.assertRaises(TimeoutError):
+            await retry(
+                lambda: asyncio.wait_for(server.call_tool("t", {}), 0.01),
+                2,
+                0.001,
+                0.002,
+            )
+        self.assertEqual(server.calls, 2)
+
+
+class HedgedStreamTest(unittest.IsolatedAsyncioTestCase):
+    def tracker(self, latency: float = 0.02, samples: int = 20) -> LatencyTracker:
+        tracker = LatencyTracker()
+        for _ in range(samples):
+            tracker.add(latency)
+        return tracker
+
+    async def test_streams_all_chunks(self):
+        tracker = LatencyTracker()
+        stream = hedged_stream(opener(FakeStream(["a", "b"])), tracker)
+        self.assertEqual(await collect(stream), ["a", "b"])
+        self.assertEqual(len(tracker), 1)
+
+    async def test_hedges_slow_first_chunk(self):
+        slow = FakeStream(["slow"], first_delay=1)
+        fast = FakeStream(["fast", "er"])
+        stream = hedged_stream(
+            opener(slow, fast), self.tracker(), first_timeout=2, next_timeout=1
+        )
+        start = time.monotonic()
+        self.assertEqual(await collect(stream), ["fast", "er"])
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertTrue(slow.closed)
+        self.assertEqual(slow.sent, 0)
+
+    async def test_no_hedge_without_enough_samples(self):
+        slow = FakeStream(["slow"], first_delay=0.1)
+        stream = hedged_stream(opener(slow), self.tracker(samples=5))
+        self.assertEqual(await collect(stream), ["slow"])
+
+    async def test_first_chunk_timeout(self):
+        slow = FakeStream(["a"], first_delay=1)
+        stream = hedged_stream(opener(slow), LatencyTracker(), first_timeout=0.05)
+        with self.assertRaises(TimeoutError):
+            await collect(stream)
+
+    async def test_stalled_chunk_timeout(self):
+        stalled = FakeStream(["a", "b"], stall_after=1)
+        stream = hedged_stream(opener(stalled), LatencyTracker(), next_timeout=0.05)
+        chunks = []
+        with self.assertRaises(TimeoutError):
+            async for chunk in stream:
+                chunks.append(chunk)
+        self.assertEqual(chunks, ["a"])
+
+    async def test_error_is_raised(self):
+        failing = FakeStream([], error=RuntimeError("quota exceeded"))
+        with self.assertRaises(RuntimeError):
+            await collect(hedged_stream(opener(failing), LatencyTracker()))
+
+    async def test_hedge_used_when_first_fails(self):
+        failing = FakeStream([], first_delay=0.1, error=RuntimeError("reset"))
+        backup = FakeStream(["ok"], first_delay=0.2)
+        stream = hedged_stream(opener(failing, backup), self.tracker())
+        self.assertEqual(await collect(stream), ["ok"])
+
+    async def test_empty_stream(self):
+        stream = hedged_stream(opener(FakeStream([])), LatencyTracker())
+        self.assertEqual(await collect(stream), [])
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_failures(self):
+        breaker = CircuitBreaker(max_failures=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertTrue(breaker.open)
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_failures(self):
+        breaker = CircuitBreaker(max_failures=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+
+    def test_single_trial_after_reset_timeout(self):
+        breaker = CircuitBreaker(max_failures=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertFalse(breaker.open)
+        self.assertTrue(breaker.allow())
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker(max_failures=1, reset_timeout=60)
+        breaker.record_failure()
+        breaker.opened_at -= 60  # type: ignore
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+    def test_released_trial_allows_next(self):
+        breaker = CircuitBreaker(max_failures=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.release()
+        self.assertTrue(breaker.allow())
+
+
+class CallToolTest(unittest.IsolatedAsyncioTestCase):
+    """MCPClient.call_tool against fake tool servers"""
+
+    def setUp(self):
+        os.environ.setdefault("GOOGLE_API_KEY", "test")
+        from assistant.client import MCPClient
+
+        self.client = MCPClient()
+        self.server = FakeToolServer()
+        self.client.tool_servers = {"get_deck_names": self.server}  # type: ignore
+        self.client.tool_options = {"get_deck_names": {"idempotent": True}}
+        self.breaker = CircuitBreaker(max_failures=2, reset_timeout=60)
+        self.client.breakers = {self.server.name: self.breaker}
+
+    async def call(self):
+        return await self.client.call_tool("get_deck_names", {})
+
+    async def test_retries_idempotent_tool(self):
+        self.server.fail_times = resilience.tool_retries
+        self.assertEqual(await self.call(), "ok")
+
+    async def test_fallback_and_breaker_open(self):
+        self.client.tool_options = {}
+        self.server.fail_times = 10
+        for _ in range(2):
+            self.assertEqual(await self.call(), resilience.tool_fallback)
+        self.assertEqual(await self.call(), resilience.tool_fallback)
+        self.assertEqual(self.server.calls, 2)
+
+    async def test_unavailable_error_result_is_failure(self):
+        self.server.error = "AnkiConnect is unavailable: ConnectError('refused')"
+        self.assertEqual(await self.call(), resilience.tool_fallback)
+        self.assertEqual(self.server.calls, 1 + resilience.tool_retries)
+        await self.call()
+        self.assertTrue(self.breaker.open)
+        calls = self.server.calls
+        self.assertEqual(await self.call(), resilience.tool_fallback)
+        self.assertEqual(self.server.calls, calls)
+
+    async def test_other_error_result_is_returned(self):
+        self.server.error = "Deck 'Spanish' was not found"
+        result = await self.call()
+        self.assertIn("was not found", result)  # type: ignore
+        self.assertEqual(self.server.calls, 1)
+        self.assertEqual(self.breaker.failures, 0)
+
+    async def test_cancelled_trial_releases_breaker(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.opened_at -= 60  # type: ignore
+        self.server.hang = True
+        task = asyncio.create_task(self.call())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.server.hang = False
+        self.assertEqual(await self.call(), "ok")
+        self.assertFalse(self.breaker.open)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from types import SimpleNamespace
+import numpy as np
+from faster_whisper.transcribe import restore_speech_timestamps
+from faster_whisper.vad import collect_chunks
+from assistant.transcriber import SAMPLE_RATE, transcribe_batch
+
+
+def decode(audio: np.ndarray) -> str:
+    """Fake recognition, each utterance is filled with its own sample value"""
+    return "".join(f" u{int(v)}" for v in np.unique(audio) if v)
+
+
+class FakeModel:
+    feature_extractor = SimpleNamespace(chunk_length=30)
+
+    def __init__(self):
+        self.calls = 0
+
+    def transcribe(self, audio, **kwargs):
+        self.calls += 1
+        return [SimpleNamespace(start=0.0, text=decode(audio))], None
+
+
+class FakePipeline:
+    """Chunks clips like faster-whisper's BatchedInferencePipeline.
+
+    Each chunk is decoded to one segment starting at the chunk, as with
+    the pipeline's default without_timestamps=True.
+    """
+
+    def __init__(self):
+        self.chunks = 0
+
+    def transcribe(self, audio, clip_timestamps, batch_size, **kwargs):
+        clips = [
+            {k: int(v * SAMPLE_RATE) for k, v in clip.items()}
+            for clip in clip_timestamps
+        ]
+        chunks, metadata = collect_chunks(audio, clips, max_duration=30)
+        self.chunks += len(chunks)
+        segments = [
+            SimpleNamespace(
+                start=meta["offset"],
+                end=meta["offset"],
+                words=None,
+                text=decode(chunk),
+            )
+            for chunk, meta in zip(chunks, metadata)
+        ]
+        return restore_speech_timestamps(segments, clips, SAMPLE_RATE), None
+
+
+def utterance(value: int, seconds: float) -> np.ndarray:
+    return np.full(int(seconds * SAMPLE_RATE), value, dtype=np.float32)
+
+
+class TranscribeBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.model = FakeModel()
+        self.pipeline = FakePipeline()
+
+    def test_each_utterance_gets_own_text(self):
+        audios = [utterance(v, 3) for v in (1, 2, 3, 4)]
+        texts = transcribe_batch(self.model, self.pipeline, audios)
+        self.assertEqual(texts, [" u1", " u2", " u3", " u4"])
+        self.assertEqual(self.pipeline.chunks, 4)
+        self.assertEqual(self.model.calls, 0)
+
+    def test_uneven_lengths(self):
+        audios = [utterance(1, 0.4), utterance(2, 15), utterance(3, 1)]
+        texts = transcribe_batch(self.model, self.pipeline, audios)
+        self.assertEqual(texts, [" u1", " u2", " u3"])
+
+    def test_long_utterance_falls_back(self):
+        audios = [utterance(1, 2), utterance(2, 20)]
+        texts = transcribe_batch(self.model, self.pipeline, audios)
+        self.assertEqual(texts, [" u1", " u2"])
+        self.assertEqual(self.model.calls, 2)
+        self.assertEqual(self.pipeline.chunks, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
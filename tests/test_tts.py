@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+import unittest
+from assistant.tts import Audio, PhraseCache, Speaker, TTSBackend
+
+
+class FakeBackend(TTSBackend):
+    """Records rendered and played text instead of using a TTS engine"""
+
+    def __init__(self):
+        self.rendered: list[str] = []
+        self.played: list[bytes] = []
+
+    def settings(self) -> tuple:
+        return ("fake",)
+
+    def render(self, text: str) -> Audio:
+        self.rendered.append(text)
+        return Audio(text.encode() * 2, 16000, 1, 2)
+
+    def play(self, audio: Audio) -> None:
+        self.played.append(audio.pcm)
+
+
+class SpeakerTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.backend = FakeBackend()
+        self.cache = PhraseCache(self.backend, max_items=4, path=self.path)
+        self.speaker = Speaker(self.backend, self.cache, ["Hello user!"], min_count=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_caches_repeated_sentences(self):
+        for _ in range(4):
+            self.speaker.speak("Nice work. Next card.")
+        self.assertEqual(self.backend.rendered, ["Nice work.", "Next card."] * 2)
+        self.assertEqual(len(self.backend.played), 8)
+        self.assertEqual(len(self.cache.items), 2)
+
+    def test_plays_in_order(self):
+        self.speaker.warm()
+        self.speaker.speak("Hello user! How are you?")
+        self.assertEqual(self.backend.played, [b"Hello user!" * 2, b"How are you?" * 2])
+        self.assertEqual(self.backend.rendered, ["Hello user!", "How are you?"])
+
+    def test_cache_persists_and_evicts_files(self):
+        for text in ["One.", "Two.", "Three.", "Four.", "Five."]:
+            self.cache.put(text, self.backend.render(text))
+        cache = PhraseCache(self.backend, max_items=4, path=self.path)
+        self.assertIsNone(cache.get("One."))
+        self.assertEqual(cache.get("five."), Audio(b"Five." * 2, 16000, 1, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()